@@ -1,31 +1,37 @@
 from __future__ import annotations
 
+import shutil
 import typing
 from typing import Annotated
 
 import typer
-from rich.console import Console
-from rich.table import Table, box
-
-from uv_outdated.utils import (
-    Package,
-    get_uv_outdated,
-    get_locked_packages_and_deps,
-    get_direct_dependencies,
-    get_package_specifiers,
-    is_locked_by_specifier,
-    find_direct_ancestors,
-    group_packages_by_dependency_groups,
-    OutdatedPkg,
-    SpecifierStr,
-    Name,
-)
 
 if typing.TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Callable
+
+    from packaging.specifiers import SpecifierSet
+
+    from uv_outdated.utils import (
+        Name,
+        OutdatedPkg,
+        OutEntry,
+        Package,
+        SpecifierStr,
+    )
+
+    type RowBuilder = Callable[[Name, Package, OutdatedPkg, bool, str], list[str]]
 
 app = typer.Typer()
 
+# Precompiled row formatting templates; %-formatting dispatches straight to C
+# instead of rebuilding f-string bytecode for every row
+_FMT_NAME = "[cyan]%s[/cyan]"
+_FMT_NAME_INDENT = "  [cyan]%s[/cyan]"
+_FMT_NAME_TRANSITIVE = "  [italic cyan]%s[/italic cyan]"
+_FMT_VERSION = "[bold]%s[/bold]"
+_FMT_LATEST_LOCKED = "[yellow]%s[/yellow]"
+_FMT_LATEST_FREE = "[red]%s[/red]"
+
 
 @app.command()
 def cli(
@@ -58,36 +64,55 @@ def cli(
             help="Group outdated dependencies by their direct dependency ancestor.",
         ),
     ] = False,
+    offline: Annotated[
+        bool,
+        typer.Option(
+            "--offline/--online",
+            help="Use cached outdated information instead of querying uv.",
+        ),
+    ] = False,
 ) -> None:
     """
     Show outdated packages in the current project, or run tests.
     """
-    console = Console()
+    # Defer the heavy imports until the command actually runs, so --help and
+    # completion don't pay the rich/packaging import cost
+    from rich.console import Console
+    from rich.table import Table, box
+
+    from uv_outdated.utils import (
+        OutEntry,
+        compile_specifiers,
+        compute_ancestor_map,
+        group_packages_by_dependency_groups,
+        load_state,
+    )
+
+    # Pass the terminal width explicitly so Rich skips size auto-detection
+    console = Console(width=shutil.get_terminal_size().columns)
 
     try:
-        outdated = get_uv_outdated()
-        packages = get_locked_packages_and_deps()
-        direct = get_direct_dependencies()
+        outdated, packages, direct, specifiers = load_state(refresh_outdated=not offline)
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
         raise
 
-    # Extract helper data from packages
-    specifiers = get_package_specifiers(packages)
+    # Precompute an index of direct dependency names for O(1) membership checks
+    direct_set = frozenset(direct)
 
-    # Collect all outdated packages that match our filters
-    outdated_packages = []
-    for name, pkg in packages.items():
-        if name not in outdated:
-            continue
-        outdated_pkg = outdated[name]
-        is_direct = name in direct
-        if direct_only and not is_direct:
-            continue
-        if transitive_only and is_direct:
-            continue
+    # Parse every specifier once instead of re-parsing per row
+    compiled_specifiers = compile_specifiers(specifiers)
 
-        outdated_packages.append((name, pkg, outdated_pkg, is_direct))
+    # Collect all outdated packages that match our filters. Iterate the
+    # outdated dict (typically a small fraction of the lockfile) and look up
+    # the Package objects, rather than scanning every locked package.
+    outdated_packages = [
+        OutEntry(name, pkg, outdated_pkg, name in direct_set)
+        for name, outdated_pkg in outdated.items()
+        if (pkg := packages.get(name)) is not None
+        and not (direct_only and name not in direct_set)
+        and not (transitive_only and name in direct_set)
+    ]
 
     # Handle case where no outdated packages are found
     if not outdated_packages:
@@ -103,9 +128,33 @@ def cli(
             console.print(f"Checked {len(outdated)} packages for updates")
         return
 
+    # Precompute the formatted Dependents column once per package, so rows
+    # repeated across ancestor groups don't rebuild and re-sort the same set
+    dependents_strs = {
+        name: ", ".join(sorted({dep.package.name for dep in pkg.dependents}))
+        for name, pkg in packages.items()
+        if pkg.dependents
+    }
+
+    # When output is piped, Rich markup and table layout would be stripped
+    # anyway; emit plain tab-separated text and skip the table entirely
+    if not console.is_terminal:
+        _print_plain(outdated_packages, specifiers, dependents_strs, show_why, group_by_ancestor)
+        return
+
     # Group packages by dependency groups
     dependency_groups = group_packages_by_dependency_groups(outdated_packages)
 
+    # Precompute direct ancestors for every package in one graph pass
+    ancestor_map = compute_ancestor_map(packages, direct) if group_by_ancestor else {}
+
+    # Fix the narrow version columns to their known content width so Rich
+    # doesn't have to measure every cell in those columns
+    current_width = latest_width = 8
+    for entry in outdated_packages:
+        current_width = max(current_width, len(entry.pkg.version))
+        latest_width = max(latest_width, len(entry.outdated.latest_version))
+
     # Create table with sections
     table = Table(
         show_header=show_headers,
@@ -115,189 +164,186 @@ def cli(
         pad_edge=False,
     )
     table.add_column("Package", style="cyan", min_width=10, ratio=2, no_wrap=True)
-    table.add_column("Current", style="bold", min_width=8, no_wrap=True)
-    table.add_column("Latest", min_width=8, no_wrap=True)
+    table.add_column("Current", style="bold", width=current_width, no_wrap=True)
+    table.add_column("Latest", width=latest_width, no_wrap=True)
     if show_why:
         table.add_column("Constraint", min_width=10, ratio=1, no_wrap=True)
         table.add_column("Dependents", min_width=10, max_width=30, no_wrap=True)
     table.add_column("Description", min_width=20, ratio=3, no_wrap=True)
 
-    # Add sections in order: main dependencies first, then extras alphabetically
-    section_order = ["", *sorted(group for group in dependency_groups if group != "")]
+    # Specialize the row builder once for this run's options and lookup tables
+    build_row = _make_row_builder(show_why, specifiers, compiled_specifiers, dependents_strs)
 
-    for group_name in section_order:
-        if group_name not in dependency_groups:
-            continue
+    # Fast path for the common case: everything lives in the default group and
+    # no ancestor grouping was requested, so skip the section machinery
+    if not group_by_ancestor and set(dependency_groups) == {""}:
+        for row in generate_normal_rows(outdated_packages, build_row):
+            table.add_row(*row)
+        console.print(table)
+        return
 
-        group_packages = dependency_groups[group_name]
+    # Collect all rows per section first, then append them to the table in one
+    # tight loop; add_row validates and wraps cells one call at a time, so
+    # interleaving it with row generation maximizes per-row overhead. The
+    # groups are already in presentation order (main first, extras sorted).
+    sections: list[list[list[str]]] = []
+    for group_name, group_packages in dependency_groups.items():
         if not group_packages:
             continue
 
-        # Add section header with title
-        section_title = rf"\[group:{group_name}]" if group_name else ""
-        table.add_section()
+        section_rows: list[list[str]] = []
         # Add a row with the section title
+        section_title = rf"\[group:{group_name}]" if group_name else ""
         empty_cols = [""] * (5 if show_why else 3)
         if section_title:
-            table.add_row(f"[bold blue]{section_title}[/bold blue]", *empty_cols)
+            section_rows.append([f"[bold blue]{section_title}[/bold blue]", *empty_cols])
 
-        # Generate and add rows for this section
+        # Generate rows for this section
         if group_by_ancestor:
-            for row in generate_grouped_rows(group_packages, packages, specifiers, show_why):
-                table.add_row(*row)
+            section_rows.extend(
+                generate_grouped_rows(group_packages, ancestor_map, build_row, show_why)
+            )
         else:
-            for row in generate_normal_rows(group_packages, specifiers, show_why):
-                table.add_row(*row)
+            section_rows.extend(generate_normal_rows(group_packages, build_row))
+        sections.append(section_rows)
+
+    add_row = table.add_row
+    for section_rows in sections:
+        table.add_section()
+        for row in section_rows:
+            add_row(*row)
 
     console.print(table)
 
 
-def generate_normal_rows(
-    outdated_packages: list[tuple[Name, Package, OutdatedPkg, bool]],
+def _print_plain(
+    outdated_packages: list[OutEntry],
     specifiers: dict[Name, SpecifierStr],
+    dependents_strs: dict[Name, str],
     show_why: bool,
-) -> Generator[list[str], None, None]:
-    """Generate table rows for outdated packages in a flat list."""
+    group_by_ancestor: bool,
+) -> None:
+    """Print outdated packages as plain tab-separated text (non-TTY output)."""
     for name, pkg, outdated_pkg, is_direct in outdated_packages:
-        yield _create_package_row(
-            name,
-            pkg,
-            outdated_pkg,
-            is_direct,
-            specifiers,
-            show_why,
-            "[cyan]{name}[/cyan]",
-        )
+        prefix = "  " if group_by_ancestor and not is_direct else ""
+        columns = [prefix + name, pkg.version, outdated_pkg.latest_version]
+        if show_why:
+            columns.append(specifiers.get(name, ""))
+            columns.append("" if is_direct else dependents_strs.get(name, ""))
+        columns.append(pkg.summary)
+        print("\t".join(columns))
+
+
+def generate_normal_rows(
+    outdated_packages: list[OutEntry],
+    build_row: RowBuilder,
+) -> list[list[str]]:
+    """Generate table rows for outdated packages in a flat list."""
+    return [build_row(*entry, _FMT_NAME) for entry in outdated_packages]
 
 
 def generate_grouped_rows(
-    outdated_packages: list[tuple[Name, Package, OutdatedPkg, bool]],
-    packages: dict[Name, Package],
-    specifiers: dict[Name, SpecifierStr],
+    outdated_packages: list[OutEntry],
+    ancestor_map: dict[Name, frozenset[Name]],
+    build_row: RowBuilder,
     show_why: bool,
-) -> Generator[list[str], None, None]:
+) -> list[list[str]]:
     """Generate table rows for outdated packages grouped by direct ancestor."""
-    # Group packages by their direct dependency ancestors
-    groups: dict[str, list[tuple[Name, Package, OutdatedPkg, bool]]] = {}
-    direct_dependencies_with_groups: set[str] = set()
+    from uv_outdated.utils import group_outdated_by_ancestor
 
-    for name, pkg, outdated_pkg, is_direct in outdated_packages:
-        if is_direct:
-            # All direct dependencies get their own group
-            groups.setdefault(name, []).append((name, pkg, outdated_pkg, is_direct))
-        else:
-            # Find ancestors for transitive dependencies
-            ancestors = find_direct_ancestors(name, packages)
-            if ancestors:
-                for ancestor in sorted(ancestors):
-                    groups.setdefault(ancestor, []).append((name, pkg, outdated_pkg, is_direct))
-                    # Track that this direct dependency has transitive deps
-                    direct_dependencies_with_groups.add(ancestor)
-            else:
-                # Orphaned packages (shouldn't happen but just in case)
-                groups.setdefault("_unknown", []).append((name, pkg, outdated_pkg, is_direct))
-
-    # Yield rows
-    for group_key in sorted(groups.keys()):
-        group_packages = groups[group_key]
+    # Partition each group into its direct entry (if outdated) and its
+    # transitive entries up front so emission never has to rescan the group
+    direct_entry_by_group, transitives_by_group = group_outdated_by_ancestor(
+        outdated_packages, ancestor_map
+    )
+
+    # Build rows. A transitive package appears under every one of its
+    # ancestors; build its row once and reuse it by reference (add_row copies
+    # cell values into the table, so sharing the list is safe)
+    row_cache: dict[Name, list[str]] = {}
+    rows: list[list[str]] = []
+    for group_key in sorted(direct_entry_by_group.keys() | transitives_by_group.keys()):
+        direct_entry = direct_entry_by_group.get(group_key)
+        transitive_deps = transitives_by_group.get(group_key, [])
 
         if group_key == "_unknown":
-            # Yield header for unknown ancestors
+            # Add header for unknown ancestors
             empty_cols = [""] * (5 if show_why else 3)
-            yield ["[dim]Unknown ancestor[/dim]", *empty_cols]
-
-            # Yield the orphaned packages
-            for name, pkg, outdated_pkg, is_direct in group_packages:
-                yield _create_package_row(
-                    name,
-                    pkg,
-                    outdated_pkg,
-                    is_direct,
-                    specifiers,
-                    show_why,
-                    "  [cyan]{name}[/cyan]",
-                )
-        elif group_key not in direct_dependencies_with_groups:
-            # Direct dependency with no transitive deps - show directly without header
-            name, pkg, outdated_pkg, is_direct = group_packages[0]  # Should only be one
-            yield _create_package_row(
-                name,
-                pkg,
-                outdated_pkg,
-                is_direct,
-                specifiers,
-                show_why,
-                "[cyan]{name}[/cyan]",
-            )
+            rows.append(["[dim]Unknown ancestor[/dim]", *empty_cols])
+
+            # Add the orphaned packages
+            for entry in transitive_deps:
+                rows.append(build_row(*entry, _FMT_NAME_INDENT))
+            continue
+
+        if direct_entry is not None:
+            # Show the direct dependency itself (with or without transitives)
+            rows.append(build_row(*direct_entry, _FMT_NAME))
         else:
-            # Direct dependency with transitive deps - show header with direct dep info,
-            # then transitive deps
-            direct_dep = next(
-                (item for item in group_packages if item[3]), None
-            )  # Find the direct dependency
-            transitive_deps = [item for item in group_packages if not item[3]]
-
-            if direct_dep:
-                name, pkg, outdated_pkg, is_direct = direct_dep
-                yield _create_package_row(
-                    name,
-                    pkg,
-                    outdated_pkg,
-                    is_direct,
-                    specifiers,
-                    show_why,
-                    "[cyan]{name}[/cyan]",
-                )
-            else:
-                # No direct dep found, just show group header
-                empty_cols = [""] * (5 if show_why else 3)
-                yield [f"[cyan]{group_key}[/cyan]", *empty_cols]
-
-            # Yield transitive dependencies
-            for name, pkg, outdated_pkg, is_direct in transitive_deps:
-                yield _create_package_row(
-                    name,
-                    pkg,
-                    outdated_pkg,
-                    is_direct,
-                    specifiers,
-                    show_why,
-                    "  [italic cyan]{name}[/italic cyan]",
-                )
-
-
-def _create_package_row(
-    name: Name,
-    pkg: Package,
-    outdated_pkg: OutdatedPkg,
-    is_direct: bool,
-    specifiers: dict[Name, SpecifierStr],
+            # Direct dependency is not outdated itself, just show group header
+            empty_cols = [""] * (5 if show_why else 3)
+            rows.append([f"[cyan]{group_key}[/cyan]", *empty_cols])
+
+        # Add transitive dependencies
+        for entry in transitive_deps:
+            row = row_cache.get(entry.name)
+            if row is None:
+                row = row_cache[entry.name] = build_row(*entry, _FMT_NAME_TRANSITIVE)
+            rows.append(row)
+
+    return rows
+
+
+def _make_row_builder(
     show_why: bool,
-    name_format: str,
-) -> list[str]:
-    """Create a package row with consistent formatting."""
-    latest = outdated_pkg.latest_version
-    constraint = ""
-    if latest != pkg.version:
-        if is_locked_by_specifier(specifiers, name, latest):
-            latest_colored = f"[yellow]{latest}[/yellow]"
-            constraint = specifiers.get(name, "")
-        else:
-            latest_colored = f"[red]{latest}[/red]"
-    else:
-        latest_colored = f"[yellow]{latest}[/yellow]"
+    specifiers: dict[Name, SpecifierStr],
+    compiled_specifiers: dict[Name, SpecifierSet],
+    dependents_strs: dict[Name, str],
+) -> RowBuilder:
+    """
+    Build a row-construction closure with show_why and the lookup tables
+    baked in, so the per-row code has no branches on run-wide options.
+    """
 
-    parents = {dep.package.name for dep in pkg.dependents}
-    dependents_str = "" if is_direct or not parents else ", ".join(sorted(parents))
-    desc = pkg.summary
-    name_cyan = name_format.format(name=name)
-    version_bold = f"[bold]{pkg.version}[/bold]"
+    def _latest_and_constraint(name: Name, pkg: Package, latest: str) -> tuple[str, str]:
+        if latest != pkg.version:
+            spec_set = compiled_specifiers.get(name)
+            if spec_set is not None and not spec_set.contains(latest):
+                return _FMT_LATEST_LOCKED % latest, specifiers.get(name, "")
+            return _FMT_LATEST_FREE % latest, ""
+        return _FMT_LATEST_LOCKED % latest, ""
 
-    row_items = [name_cyan, version_bold, latest_colored]
     if show_why:
-        row_items.extend([constraint, dependents_str])
-    row_items.append(desc)
-    return row_items
+
+        def build_row(
+            name: Name, pkg: Package, outdated_pkg: OutdatedPkg, is_direct: bool, name_format: str
+        ) -> list[str]:
+            latest_colored, constraint = _latest_and_constraint(
+                name, pkg, outdated_pkg.latest_version
+            )
+            return [
+                name_format % name,
+                _FMT_VERSION % pkg.version,
+                latest_colored,
+                constraint,
+                "" if is_direct else dependents_strs.get(name, ""),
+                pkg.summary,
+            ]
+
+    else:
+
+        def build_row(
+            name: Name, pkg: Package, outdated_pkg: OutdatedPkg, is_direct: bool, name_format: str
+        ) -> list[str]:
+            latest_colored, _ = _latest_and_constraint(name, pkg, outdated_pkg.latest_version)
+            return [
+                name_format % name,
+                _FMT_VERSION % pkg.version,
+                latest_colored,
+                pkg.summary,
+            ]
+
+    return build_row
 
 
 if __name__ == "__main__":
@@ -1,36 +1,46 @@
 from __future__ import annotations
 
-import importlib.metadata
+import functools
+import gzip
+import hashlib
 import json
 import os
+import pickle
+import re
 import subprocess
 import tomllib
 
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from itertools import chain
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
 from packaging.requirements import Requirement
 from packaging.specifiers import SpecifierSet, InvalidSpecifier
 from packaging.utils import canonicalize_name
 from packaging.version import Version
-from pydantic import BaseModel
+
+# Both parsers are pure functions of their input string and get called with
+# the same names and requirement strings over and over across the lock-file
+# walks, so cache them process-wide.
+_canon = functools.lru_cache(maxsize=None)(canonicalize_name)
+_req = functools.lru_cache(maxsize=None)(Requirement)
 
 type Name = str
 type SpecifierStr = str
 type VersionStr = str
 
 
-class SitePackage(BaseModel):
-    model_config = {"arbitrary_types_allowed": True}
-
+@dataclass(slots=True)
+class SitePackage:
     name: str
     version: str
     summary: str = ""
-    requires_dist: list[str] = []
-    provides_extra: list[str] = []
-    distribution: Any  # Changed from PathDistribution to Any for testing flexibility
+    requires_dist: list[str] = field(default_factory=list)
+    provides_extra: list[str] = field(default_factory=list)
+    distribution: Any = None  # Changed from PathDistribution to Any for testing flexibility
 
 
 @dataclass
@@ -65,12 +75,74 @@ def run_uv(args: list[str]) -> subprocess.CompletedProcess[str]:
     )
 
 
-class OutdatedPkg(BaseModel):
+@dataclass(slots=True)
+class OutdatedPkg:
     name: Name
     version: VersionStr
     latest_version: VersionStr
 
 
+class OutEntry(NamedTuple):
+    """A filtered outdated package as threaded through the CLI row pipeline."""
+
+    name: Name
+    pkg: Package
+    outdated: OutdatedPkg
+    is_direct: bool
+
+
+_uv_lock_cache: tuple[int, dict[str, Any]] | None = None
+_pyproject_cache: tuple[int, dict[str, Any]] | None = None
+
+
+def _read_uv_lock() -> dict[str, Any]:
+    """Parse uv.lock, memoized on the file's mtime."""
+    global _uv_lock_cache
+
+    try:
+        mtime_ns = Path("uv.lock").stat().st_mtime_ns
+    except OSError:
+        raise RuntimeError("uv.lock not found") from None
+
+    if _uv_lock_cache is not None and _uv_lock_cache[0] == mtime_ns:
+        return _uv_lock_cache[1]
+
+    try:
+        with Path("uv.lock").open("rb") as f:
+            uv_lock = tomllib.load(f)
+    except FileNotFoundError:
+        raise RuntimeError("uv.lock not found") from None
+    except tomllib.TOMLDecodeError as e:
+        raise RuntimeError(f"Failed to parse uv.lock: {e}") from e
+
+    _uv_lock_cache = (mtime_ns, uv_lock)
+    return uv_lock
+
+
+def _read_pyproject() -> dict[str, Any]:
+    """Parse pyproject.toml, memoized on the file's mtime."""
+    global _pyproject_cache
+
+    try:
+        mtime_ns = Path("pyproject.toml").stat().st_mtime_ns
+    except OSError:
+        raise RuntimeError("pyproject.toml not found") from None
+
+    if _pyproject_cache is not None and _pyproject_cache[0] == mtime_ns:
+        return _pyproject_cache[1]
+
+    try:
+        with Path("pyproject.toml").open("rb") as f:
+            pyproject = tomllib.load(f)
+    except FileNotFoundError:
+        raise RuntimeError("pyproject.toml not found") from None
+    except tomllib.TOMLDecodeError as e:
+        raise RuntimeError(f"Failed to parse pyproject.toml: {e}") from e
+
+    _pyproject_cache = (mtime_ns, pyproject)
+    return pyproject
+
+
 def get_uv_outdated() -> dict[Name, OutdatedPkg]:
     """Get outdated packages from uv pip list command, with fallback to empty dict."""
     result = run_uv(["pip", "list", "--outdated", "--format=json"])
@@ -87,103 +159,187 @@ def get_uv_outdated() -> dict[Name, OutdatedPkg]:
         return {}
 
     return {
-        canonicalize_name(pkg["name"]): OutdatedPkg.model_validate(pkg) for pkg in packages_data
+        _canon(pkg["name"]): OutdatedPkg(
+            name=pkg["name"],
+            version=pkg["version"],
+            latest_version=pkg["latest_version"],
+        )
+        for pkg in packages_data
     }
 
 
+# Matches the Python version line of a pyvenv.cfg: stdlib venvs write
+# "version = X.Y.Z", uv and virtualenv write "version_info = X.Y.Z".
+_PYVENV_VERSION_RE = re.compile(r"^version(?:_info)?\s*=\s*(\S+)", re.MULTILINE)
+
+
+@functools.cache
 def get_site_packages_from_uv() -> Path:
-    """Get the site-packages path from the current uv venv."""
+    """Get the site-packages path from the current uv venv.
+
+    Cached for the lifetime of the process; the venv does not move while the
+    tool runs, and the lookup spawns a uv subprocess.
+    """
     result = run_uv(["python", "find"])
     if result.returncode != 0:
         raise RuntimeError("Could not find Python executable with uv")
     python_path = Path(result.stdout.strip())
     venv_dir = python_path.parent.parent
     pyvenv_cfg = venv_dir / "pyvenv.cfg"
-    py_version = None
-    with pyvenv_cfg.open("r") as f:
-        for line in f:
-            if line.startswith("version"):
-                py_version = line.strip().split("=")[1].strip()
-                break
-    if not py_version:
+    version_match = _PYVENV_VERSION_RE.search(pyvenv_cfg.read_text())
+    if not version_match:
         raise RuntimeError("Could not find Python version in pyvenv.cfg")
-    py_version = ".".join(py_version.split(".")[:2])
+    py_version = ".".join(version_match.group(1).split(".")[:2])
     site_packages = venv_dir / "lib" / f"python{py_version}" / "site-packages"
     if site_packages.is_dir():
         return site_packages
     raise RuntimeError(f"Could not find site-packages at {site_packages}")
 
 
-def get_all_metadata_from_site_packages() -> dict[Name, SitePackage]:
+def _parse_metadata(dist_info_dir: Path) -> SitePackage | None:
     """
-    Parse all .dist-info/METADATA files in site-packages for metadata.
+    Read the handful of headers we need straight from a METADATA file.
+
+    importlib.metadata's PathDistribution runs the full email parser over the
+    whole file; a startswith scan over the header block (everything before the
+    first blank line) is enough for the five fields used here.
+    """
+    try:
+        with (dist_info_dir / "METADATA").open("rb") as f:
+            header_block = f.read().split(b"\n\n", 1)[0]
+    except OSError:
+        return None
+
+    name = ""
+    version = ""
+    summary = ""
+    requires_dist: list[str] = []
+    provides_extra: list[str] = []
+    for raw_line in header_block.split(b"\n"):
+        line = raw_line.decode("utf-8", errors="replace")
+        if line.startswith("Name:"):
+            name = line[5:].strip()
+        elif line.startswith("Version:"):
+            version = line[8:].strip()
+        elif line.startswith("Summary:"):
+            summary = line[8:].strip()
+        elif line.startswith("Requires-Dist:"):
+            requires_dist.append(line[14:].strip())
+        elif line.startswith("Provides-Extra:"):
+            provides_extra.append(line[15:].strip())
+
+    if not name:
+        return None
+
+    return SitePackage(
+        name=_canon(name),
+        version=version,
+        summary=summary,
+        requires_dist=requires_dist,
+        provides_extra=provides_extra,
+        distribution=dist_info_dir,
+    )
+
+
+def _dist_info_package_name(entry_name: str) -> Name:
+    """Canonicalized package name from a '<name>-<version>.dist-info' directory name."""
+    return _canon(entry_name.removesuffix(".dist-info").rpartition("-")[0])
+
+
+@functools.cache
+def get_all_metadata_from_site_packages(
+    names: frozenset[Name] | None = None,
+) -> dict[Name, SitePackage]:
+    """
+    Parse .dist-info/METADATA files in site-packages for metadata.
+
+    When ``names`` is given, only distributions with those canonicalized names
+    are parsed; environments often carry packages that never appear in
+    uv.lock, and reading their METADATA is wasted I/O. The result is cached
+    for the lifetime of the process; site-packages does not change while the
+    tool runs, and several callers need this data.
     """
     site_packages = get_site_packages_from_uv()
+    with os.scandir(site_packages) as entries:
+        dist_info_dirs = [
+            Path(entry.path)
+            for entry in entries
+            if entry.name.endswith(".dist-info")
+            and (names is None or _dist_info_package_name(entry.name) in names)
+            and entry.is_dir()
+        ]
     package_meta_by_package_name: dict[str, SitePackage] = {}
-    for dist_info_dir in site_packages.glob("*.dist-info"):
-        dist = importlib.metadata.PathDistribution(dist_info_dir)
-        metadata = dist.metadata
-        name = canonicalize_name(metadata["Name"])
-        package_meta_by_package_name[name] = SitePackage(
-            name=name,
-            version=metadata["Version"],
-            summary=metadata.get("Summary", ""),
-            requires_dist=metadata.get_all("Requires-Dist") or [],
-            provides_extra=metadata.get_all("Provides-Extra") or [],
-            distribution=dist,
-        )
+    if dist_info_dirs:
+        # The parse is I/O bound (one small file read per directory), so a
+        # thread pool overlaps the reads; aggregation stays serial.
+        with ThreadPoolExecutor(max_workers=min(32, len(dist_info_dirs))) as executor:
+            for site_package in executor.map(_parse_metadata, dist_info_dirs):
+                if site_package is not None:
+                    package_meta_by_package_name[site_package.name] = site_package
     return package_meta_by_package_name
 
 
 def _parse_dependency_name(dep: dict[str, Any] | str) -> str:
     """Extract dependency name from various formats."""
     if isinstance(dep, dict):
-        return canonicalize_name(dep.get("name", ""))
+        return _canon(dep.get("name", ""))
     else:
-        return canonicalize_name(dep.split()[0].split("=")[0])
+        # Only the first token matters; split(None, 1) and partition avoid
+        # materializing the rest of the string.
+        return _canon(dep.split(None, 1)[0].partition("=")[0])
 
 
-def _create_requirement_from_dep(
-    dep_name: str, parent_name: str, site_metadata_by_name: dict[str, SitePackage]
-) -> Requirement:
-    """Create a Requirement object from dependency name and site metadata."""
-    req_str = dep_name
-    if parent_name in site_metadata_by_name:
-        # Find the actual requirement string from site-packages
-        for req_str_full in site_metadata_by_name[parent_name].requires_dist:
+def _build_requirement_index(
+    site_metadata_by_name: dict[str, SitePackage],
+) -> dict[str, dict[str, Requirement]]:
+    """
+    Parse each requires_dist entry exactly once, indexed by parent package
+    name and canonicalized dependency name. Matched edges reuse the
+    Requirement built here; nothing is reparsed at lookup time.
+
+    When a parent lists the same dependency several times (e.g. with different
+    markers), the first entry wins, matching the previous linear-scan behavior.
+    """
+    requirement_index: dict[str, dict[str, Requirement]] = {}
+    for parent_name, meta in site_metadata_by_name.items():
+        by_dep_name: dict[str, Requirement] = {}
+        for req_str in meta.requires_dist:
             try:
-                req = Requirement(req_str_full)
-                if canonicalize_name(req.name) == dep_name:
-                    req_str = req_str_full
-                    break
+                req = _req(req_str)
             except (ValueError, TypeError):
                 continue
-
-    try:
-        return Requirement(req_str)
-    except (ValueError, TypeError):
-        # Fallback to basic requirement if parsing fails
-        return Requirement(dep_name)
+            by_dep_name.setdefault(_canon(req.name), req)
+        requirement_index[parent_name] = by_dep_name
+    return requirement_index
 
 
-def _populate_package_dependencies(
+def _populate_package_graph(
     packages: dict[Name, Package],
     uv_lock: dict[str, Any],
     site_metadata_by_name: dict[str, SitePackage],
 ) -> None:
-    """Populate dependencies and optional-dependencies for each package."""
+    """
+    Populate dependencies, optional-dependencies, and dependents in one pass.
+
+    Both directions of the graph come from the same uv.lock edges, so each
+    dependency name is parsed once and used for the requires entry of the
+    parent and the dependents entry of the child.
+    """
+    requirement_index = _build_requirement_index(site_metadata_by_name)
+
     for pkg_data in uv_lock.get("package", []):
-        name = canonicalize_name(pkg_data["name"])
+        name = _canon(pkg_data["name"])
         package = packages[name]
+        parent_reqs = requirement_index.get(name, {})
 
         # Process main dependencies
         main_deps = []
         for dep in pkg_data.get("dependencies", []):
             dep_name = _parse_dependency_name(dep)
             if dep_name:
-                main_deps.append(
-                    _create_requirement_from_dep(dep_name, name, site_metadata_by_name)
-                )
+                main_deps.append(parent_reqs.get(dep_name) or _req(dep_name))
+                if dep_name in packages:
+                    packages[dep_name].dependents.append(Dependent(through="", package=package))
 
         if main_deps:
             package.requires[""] = DependencyGroup(name="", dependencies=main_deps)
@@ -194,9 +350,11 @@ def _populate_package_dependencies(
             for dep in extra_deps:
                 dep_name = _parse_dependency_name(dep)
                 if dep_name:
-                    extra_requirements.append(
-                        _create_requirement_from_dep(dep_name, name, site_metadata_by_name)
-                    )
+                    extra_requirements.append(parent_reqs.get(dep_name) or _req(dep_name))
+                    if dep_name in packages:
+                        packages[dep_name].dependents.append(
+                            Dependent(through=extra_name, package=package)
+                        )
 
             if extra_requirements:
                 package.requires[extra_name] = DependencyGroup(
@@ -204,28 +362,6 @@ def _populate_package_dependencies(
                 )
 
 
-def _populate_package_dependents(packages: dict[Name, Package], uv_lock: dict[str, Any]) -> None:
-    """Populate dependents for each package."""
-    for pkg_data in uv_lock.get("package", []):
-        parent_name = canonicalize_name(pkg_data["name"])
-        parent_package = packages[parent_name]
-
-        # Process main dependencies
-        for dep in pkg_data.get("dependencies", []):
-            dep_name = _parse_dependency_name(dep)
-            if dep_name and dep_name in packages:
-                dependent = Dependent(through="", package=parent_package)
-                packages[dep_name].dependents.append(dependent)
-
-        # Process optional dependencies
-        for extra_name, extra_deps in pkg_data.get("optional-dependencies", {}).items():
-            for dep in extra_deps:
-                dep_name = _parse_dependency_name(dep)
-                if dep_name and dep_name in packages:
-                    dependent = Dependent(through=extra_name, package=parent_package)
-                    packages[dep_name].dependents.append(dependent)
-
-
 def get_locked_packages_and_deps() -> dict[Name, Package]:
     """
     Parse package information from uv.lock and site-packages to create Package objects.
@@ -255,27 +391,22 @@ def get_locked_packages_and_deps() -> dict[Name, Package]:
     (extras), with proper tracking of which dependency group each relationship
     comes from.
     """
-    try:
-        with Path("uv.lock").open("rb") as f:
-            uv_lock = tomllib.load(f)
-    except FileNotFoundError:
-        raise RuntimeError("uv.lock not found") from None
-    except tomllib.TOMLDecodeError as e:
-        raise RuntimeError(f"Failed to parse uv.lock: {e}") from e
+    uv_lock = _read_uv_lock()
 
     packages: dict[Name, Package] = {}
+    locked_names = frozenset(_canon(pkg_data["name"]) for pkg_data in uv_lock.get("package", []))
 
     # Step 1: Get site-packages metadata if available
     # (gracefully handle if not available)
     try:
-        site_metadata_by_name = get_all_metadata_from_site_packages()
+        site_metadata_by_name = get_all_metadata_from_site_packages(locked_names)
     except RuntimeError:
         # Site-packages may not be available if project isn't installed
         site_metadata_by_name = {}
 
     # Step 2: Process each package in uv.lock
     for pkg_data in uv_lock.get("package", []):
-        name = canonicalize_name(pkg_data["name"])
+        name = _canon(pkg_data["name"])
 
         # Get summary from site-packages if available, otherwise empty
         summary = ""
@@ -290,24 +421,113 @@ def get_locked_packages_and_deps() -> dict[Name, Package]:
         )
         packages[name] = package
 
-    # Step 3: Populate dependencies and optional-dependencies for each package
-    _populate_package_dependencies(packages, uv_lock, site_metadata_by_name)
-
-    # Step 4: Populate dependents for each package
-    _populate_package_dependents(packages, uv_lock)
+    # Step 3: Populate both directions of the dependency graph
+    _populate_package_graph(packages, uv_lock, site_metadata_by_name)
 
     return packages
 
 
+type State = tuple[
+    dict[Name, OutdatedPkg], dict[Name, Package], dict[str, Requirement], dict[Name, SpecifierStr]
+]
+
+_CACHE_HASH_LIMIT = 65536
+
+
+def _state_cache_path() -> Path | None:
+    """
+    Build the cache file path for the current project state, keyed by the
+    mtime, size, and content hash of uv.lock plus the mtime of pyproject.toml.
+
+    Returns None if either file cannot be stat'ed.
+    """
+    try:
+        lock_path = Path("uv.lock")
+        lock_stat = lock_path.stat()
+        pyproject_stat = Path("pyproject.toml").stat()
+        with lock_path.open("rb") as f:
+            digest = hashlib.blake2b(f.read(_CACHE_HASH_LIMIT), digest_size=8).hexdigest()
+    except OSError:
+        return None
+
+    key = f"{lock_stat.st_mtime_ns}-{lock_stat.st_size}-{pyproject_stat.st_mtime_ns}-{digest}"
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    return cache_home / "uv-outdated" / f"{key}.pkl.gz"
+
+
+def load_state(refresh_outdated: bool = True) -> State:
+    """
+    Load the project state (outdated packages, locked packages, direct
+    dependencies, and specifiers), using an on-disk cache keyed by uv.lock.
+
+    On a cache hit only a file stat and a pickle load are performed; on a miss
+    the state is computed from scratch and written back to the cache. When
+    refresh_outdated is True, the `uv pip list --outdated` subprocess is always
+    re-run so the outdated information is fresh; the cached value is only used
+    when the caller explicitly asks for offline operation.
+    """
+    cache_path = _state_cache_path()
+
+    if cache_path is not None and cache_path.is_file():
+        try:
+            with gzip.open(cache_path, "rb") as f:
+                outdated, packages, direct, specifiers = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError):
+            # Corrupt cache file, or one written by an older version with
+            # different classes; fall through to a full rebuild
+            pass
+        else:
+            if refresh_outdated:
+                outdated = get_uv_outdated()
+            return outdated, packages, direct, specifiers
+
+    # The three fetches are independent: each of the first two spawns its own
+    # uv subprocess (`uv pip list` here, `uv python find` via the site-packages
+    # scan), so running them in threads overlaps the two process startups as
+    # well as the disk reads. Exceptions surface unchanged from the result()
+    # calls.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        outdated_future = executor.submit(get_uv_outdated)
+        packages_future = executor.submit(get_locked_packages_and_deps)
+        direct_future = executor.submit(get_direct_dependencies)
+        outdated = outdated_future.result()
+        packages = packages_future.result()
+        direct = direct_future.result()
+    specifiers = get_package_specifiers(packages)
+
+    if cache_path is not None:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(cache_path, "wb", compresslevel=1) as f:
+                pickle.dump((outdated, packages, direct, specifiers), f, pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            # Caching is best-effort; a read-only cache dir shouldn't break the run
+            pass
+
+    return outdated, packages, direct, specifiers
+
+
+_direct_dependencies_cache: tuple[int, dict[str, Requirement]] | None = None
+
+
 def get_direct_dependencies() -> dict[str, Requirement]:
-    """Parse direct dependencies from pyproject.toml."""
+    """
+    Parse direct dependencies from pyproject.toml.
+
+    The parsed result is memoized on the file's mtime, so repeated callers
+    within one run don't re-read and re-parse pyproject.toml.
+    """
+    global _direct_dependencies_cache
+
     try:
-        with Path("pyproject.toml").open("rb") as f:
-            pyproject = tomllib.load(f)
-    except FileNotFoundError:
+        mtime_ns = Path("pyproject.toml").stat().st_mtime_ns
+    except OSError:
         raise RuntimeError("pyproject.toml not found") from None
-    except tomllib.TOMLDecodeError as e:
-        raise RuntimeError(f"Failed to parse pyproject.toml: {e}") from e
+
+    if _direct_dependencies_cache is not None and _direct_dependencies_cache[0] == mtime_ns:
+        return _direct_dependencies_cache[1]
+
+    pyproject = _read_pyproject()
 
     dependencies = []
 
@@ -321,12 +541,17 @@ def get_direct_dependencies() -> dict[str, Requirement]:
 
     direct_dependencies_by_name: dict[str, Requirement] = {}
     for dep in dependencies:
-        req = Requirement(dep)
-        direct_dependencies_by_name[str(canonicalize_name(req.name))] = req
+        req = _req(dep)
+        direct_dependencies_by_name[_canon(req.name)] = req
 
+    _direct_dependencies_cache = (mtime_ns, direct_dependencies_by_name)
     return direct_dependencies_by_name
 
 
+# Matches the extra clause of an environment marker, e.g. "extra == 'test'".
+_EXTRA_RE = re.compile(r"""extra\s*==\s*['"]([^'"]+)['"]""")
+
+
 def get_package_specifiers(packages: dict[Name, Package]) -> dict[Name, SpecifierStr]:
     """
     Extract specifiers from packages for constraint checking.
@@ -340,60 +565,52 @@ def get_package_specifiers(packages: dict[Name, Package]) -> dict[Name, Specifie
     installed_extras: dict[Name, set[str]] = {}
 
     try:
-        with Path("uv.lock").open("rb") as f:
-            uv_lock = tomllib.load(f)
+        uv_lock = _read_uv_lock()
 
-        # First pass: collect which extras are actually installed
+        # One pass: record which extras are installed for each package and pick
+        # up specifiers from project package metadata (if available)
         for pkg_data in uv_lock.get("package", []):
-            pkg_name = str(canonicalize_name(pkg_data["name"]))
-            extras = set(pkg_data.get("extra", []))
-            installed_extras[pkg_name] = extras
-
-        # Get specifiers from project package metadata (if available)
-        for pkg in uv_lock.get("package", []):
-            meta = pkg.get("metadata", {})
-            if "requires-dist" not in meta:
-                continue
+            pkg_name: Name = _canon(pkg_data["name"])
+            installed_extras[pkg_name] = set(pkg_data.get("extra", []))
 
-            for req in meta["requires-dist"]:
+            meta = pkg_data.get("metadata", {})
+            for req in meta.get("requires-dist", []):
                 if isinstance(req, dict):
-                    dep_name = str(canonicalize_name(req.get("name", "")))
+                    dep_name = _canon(req.get("name", ""))
                     spec = req.get("specifier")
                     if dep_name and spec:
                         specifiers[dep_name] = spec
-    except (FileNotFoundError, KeyError, ValueError):
+    except (RuntimeError, KeyError, ValueError):
         # Handle cases where uv.lock is missing or malformed
         pass
 
     # Also get specifiers from site-packages, but only from installed extras
     try:
-        site_metadata = get_all_metadata_from_site_packages()
+        # The same frozenset of locked names hits the cache entry populated by
+        # get_locked_packages_and_deps.
+        site_metadata = get_all_metadata_from_site_packages(frozenset(packages))
         for pkg_name, meta in site_metadata.items():
             # Get the set of actually installed extras for this package
             pkg_installed_extras = installed_extras.get(pkg_name, set())
 
             for req_str in meta.requires_dist:
                 try:
-                    req = Requirement(req_str)
+                    req = _req(req_str)
                     if not req.specifier:
                         continue
 
                     # Check if this requirement has extra conditions
                     if req.marker:
                         # Parse the marker to see if it's conditional on an extra
-                        marker_str = str(req.marker)
-                        if "extra ==" in marker_str:
-                            # Extract the extra name from the marker
-                            # e.g., "extra == 'test'" -> "test"
-                            extra_parts = marker_str.split("extra ==")
-                            if len(extra_parts) > 1:
-                                extra_name = extra_parts[1].strip().strip("'\"").strip()
-                                # Only include constraint if this extra is installed
-                                if extra_name not in pkg_installed_extras:
-                                    continue
+                        # e.g., "extra == 'test'" -> "test"
+                        extra_match = _EXTRA_RE.search(str(req.marker))
+                        if extra_match:
+                            # Only include constraint if this extra is installed
+                            if extra_match.group(1) not in pkg_installed_extras:
+                                continue
 
                     # Include this constraint
-                    dep_name = str(canonicalize_name(req.name))
+                    dep_name = _canon(req.name)
                     specifiers[dep_name] = str(req.specifier)
                 except (ValueError, TypeError):
                     continue
@@ -403,22 +620,55 @@ def get_package_specifiers(packages: dict[Name, Package]) -> dict[Name, Specifie
     return specifiers
 
 
+def compile_specifiers(specifiers: dict[Name, SpecifierStr]) -> dict[Name, SpecifierSet]:
+    """
+    Parse specifier strings into SpecifierSet objects once.
+
+    Invalid or empty specifiers are dropped, matching how
+    is_locked_by_specifier treats them (never locking).
+    """
+    compiled: dict[Name, SpecifierSet] = {}
+    for name, spec in specifiers.items():
+        if not spec:
+            continue
+        try:
+            compiled[name] = SpecifierSet(spec)
+        except InvalidSpecifier:
+            continue
+    return compiled
+
+
+# Parsing specifiers and versions dominates the lock check, and the same
+# strings recur across rows; cache the parsed objects.
+_parse_version = functools.lru_cache(maxsize=1024)(Version)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_spec(spec: SpecifierStr) -> SpecifierSet | None:
+    """Parse a specifier string, or None when it is empty or invalid."""
+    if not spec:
+        return None
+    try:
+        return SpecifierSet(spec)
+    except InvalidSpecifier:
+        return None
+
+
 def is_locked_by_specifier(
     specifiers: dict[Name, SpecifierStr], name: Name, latest_version: VersionStr
 ) -> bool:
     """Returns True if the package is locked to a lower version by its specifier."""
-    spec = specifiers.get(name)
-    if not spec:
-        return False
-    try:
-        spec_set = SpecifierSet(spec)
-        latest = Version(latest_version)
-        return not spec_set.contains(latest)
-    except InvalidSpecifier:
+    spec_set = _parse_spec(specifiers.get(name, ""))
+    if spec_set is None:
         return False
+    return not spec_set.contains(_parse_version(latest_version))
 
 
-def find_direct_ancestors(package_name: Name, packages: dict[Name, Package]) -> set[Name]:
+def find_direct_ancestors(
+    package_name: Name,
+    packages: dict[Name, Package],
+    direct_deps: dict[str, Requirement] | None = None,
+) -> set[Name]:
     """
     Find all direct dependency ancestors for a given package.
 
@@ -428,22 +678,25 @@ def find_direct_ancestors(package_name: Name, packages: dict[Name, Package]) ->
     Args:
         package_name: The package to find ancestors for
         packages: All packages with their dependency information
+        direct_deps: The project's direct dependencies; looked up from
+            pyproject.toml when not supplied, so callers with many lookups
+            should pass it in once
 
     Returns:
         Set of direct dependency names that are ancestors of the given package
     """
-    # Get direct dependencies
-    try:
-        direct_deps = get_direct_dependencies()
-    except RuntimeError:
-        return set()
+    if direct_deps is None:
+        try:
+            direct_deps = get_direct_dependencies()
+        except RuntimeError:
+            return set()
 
     ancestors = set()
     visited = set()
-    queue = [package_name]
+    queue = deque([package_name])
 
     while queue:
-        current = queue.pop(0)
+        current = queue.popleft()
         if current in visited:
             continue
         visited.add(current)
@@ -458,16 +711,103 @@ def find_direct_ancestors(package_name: Name, packages: dict[Name, Package]) ->
             if dependent_name in direct_deps:
                 # Found a direct dependency ancestor
                 ancestors.add(dependent_name)
-            else:
+            elif dependent_name not in visited:
                 # Continue searching up the dependency tree
                 queue.append(dependent_name)
 
     return ancestors
 
 
+def compute_ancestor_map(
+    packages: dict[Name, Package], direct_deps: dict[str, Requirement]
+) -> dict[Name, frozenset[Name]]:
+    """
+    Label every package with the direct dependencies it is reachable from.
+
+    This computes the same answer as calling find_direct_ancestors for every
+    package, but in a single pass: one BFS downward from each direct dependency
+    over the dependency graph, stopping at intermediate direct dependencies
+    (mirroring how the upward search stops at the first direct ancestor).
+
+    Args:
+        packages: All packages with their dependency information
+        direct_deps: The project's direct dependencies
+
+    Returns:
+        A mapping from package name to the frozen set of its direct
+        dependency ancestors. Packages with no direct ancestor are absent.
+    """
+    # Forward adjacency (parent -> children), derived from the dependents lists
+    children: dict[Name, list[Name]] = defaultdict(list)
+    for name, pkg in packages.items():
+        for dependent in pkg.dependents:
+            children[dependent.package.name].append(name)
+
+    ancestors: dict[Name, set[Name]] = defaultdict(set)
+    for direct_name in direct_deps:
+        if direct_name not in packages:
+            continue
+        visited = {direct_name}
+        queue = deque(children.get(direct_name, ()))
+        while queue:
+            current = queue.popleft()
+            if current in visited:
+                continue
+            visited.add(current)
+            ancestors[current].add(direct_name)
+            # Upward searches stop at the first direct dependency, so don't
+            # propagate through packages that are themselves direct
+            if current not in direct_deps:
+                queue.extend(children.get(current, ()))
+
+    return {name: frozenset(names) for name, names in ancestors.items()}
+
+
+def group_outdated_by_ancestor(
+    outdated_packages: list[OutEntry],
+    ancestor_map: dict[Name, frozenset[Name]],
+) -> tuple[dict[Name, OutEntry], dict[Name, list[OutEntry]]]:
+    """
+    Partition outdated entries under the direct dependencies that pull them in.
+
+    Every direct entry forms its own group; a transitive entry is listed under
+    each of its direct ancestors from ancestor_map, or under "_unknown" when no
+    ancestor is known. This is the single grouping implementation behind the
+    CLI's grouped output.
+
+    Args:
+        outdated_packages: The filtered outdated entries to partition
+        ancestor_map: Direct ancestors per package, from compute_ancestor_map
+
+    Returns:
+        The direct entries by group name, and the transitive entries by group
+        name (including the "_unknown" bucket).
+    """
+    direct_entry_by_group: dict[Name, OutEntry] = {}
+    transitives_by_group: defaultdict[Name, list[OutEntry]] = defaultdict(list)
+
+    for entry in outdated_packages:
+        if entry.is_direct:
+            # All direct dependencies get their own group
+            direct_entry_by_group[entry.name] = entry
+            continue
+
+        ancestors = ancestor_map.get(entry.name)
+        if not ancestors:
+            # Orphaned packages (shouldn't happen but just in case)
+            transitives_by_group["_unknown"].append(entry)
+            continue
+
+        # No need to sort here: group order is determined by the callers
+        for ancestor in ancestors:
+            transitives_by_group[ancestor].append(entry)
+
+    return direct_entry_by_group, dict(transitives_by_group)
+
+
 def group_packages_by_dependency_groups(
-    outdated_packages: list[tuple[Name, Package, OutdatedPkg, bool]],
-) -> dict[str, list[tuple[Name, Package, OutdatedPkg, bool]]]:
+    outdated_packages: list[OutEntry],
+) -> dict[str, list[OutEntry]]:
     """
     Group outdated packages by their dependency groups.
 
@@ -476,9 +816,8 @@ def group_packages_by_dependency_groups(
     """
     # First, get the dependency groups from pyproject.toml
     try:
-        with Path("pyproject.toml").open("rb") as f:
-            pyproject = tomllib.load(f)
-    except (FileNotFoundError, tomllib.TOMLDecodeError):
+        pyproject = _read_pyproject()
+    except RuntimeError:
         # Fallback to simple grouping if pyproject.toml is not available
         return {"": outdated_packages}
 
@@ -490,8 +829,8 @@ def group_packages_by_dependency_groups(
         project = pyproject["project"]
         main_deps: set[Name] = set()
         for dep_str in project.get("dependencies", []):
-            req = Requirement(dep_str)
-            main_deps.add(canonicalize_name(req.name))
+            req = _req(dep_str)
+            main_deps.add(_canon(req.name))
         if main_deps:
             dependency_groups_from_toml[""] = main_deps
 
@@ -499,8 +838,8 @@ def group_packages_by_dependency_groups(
         for extra_name, extra_deps in project.get("optional-dependencies", {}).items():
             extra_set: set[Name] = set()
             for dep_str in extra_deps:
-                req = Requirement(dep_str)
-                extra_set.add(canonicalize_name(req.name))
+                req = _req(dep_str)
+                extra_set.add(_canon(req.name))
             if extra_set:
                 dependency_groups_from_toml[extra_name] = extra_set
 
@@ -509,47 +848,42 @@ def group_packages_by_dependency_groups(
         for group_name, group_deps in pyproject["dependency-groups"].items():
             group_set: set[Name] = set()
             for dep_str in group_deps:
-                req = Requirement(dep_str)
-                group_set.add(canonicalize_name(req.name))
+                req = _req(dep_str)
+                group_set.add(_canon(req.name))
             if group_set:
                 dependency_groups_from_toml[group_name] = group_set
 
+    # Invert the group membership to a dep-name -> group-names index, so each
+    # membership test below is a single dict lookup instead of a scan over
+    # every group
+    dep_to_groups: dict[Name, set[str]] = {}
+    for group_name, group_deps in dependency_groups_from_toml.items():
+        for dep_name in group_deps:
+            dep_to_groups.setdefault(dep_name, set()).add(group_name)
+
     # Now group the outdated packages
-    groups: dict[str, list[tuple[Name, Package, OutdatedPkg, bool]]] = {}
+    groups: dict[str, list[OutEntry]] = {}
+    no_groups: frozenset[str] = frozenset()
 
-    for name, pkg, outdated_pkg, is_direct in outdated_packages:
-        if is_direct:
+    for entry in outdated_packages:
+        if entry.is_direct:
             # For direct dependencies, find which groups they belong to
-            found_groups = set()
-            for group_name, group_deps in dependency_groups_from_toml.items():
-                if name in group_deps:
-                    found_groups.add(group_name)
-
-            # If not found in any specific group, put in main
-            if not found_groups:
-                found_groups.add("")
-
-            # Add to all groups it belongs to
-            for group_name in found_groups:
-                groups.setdefault(group_name, []).append((name, pkg, outdated_pkg, is_direct))
+            found_groups = set(dep_to_groups.get(entry.name, no_groups))
         else:
-            # For transitive dependencies, determine which groups they come from
-            # by examining their dependents
+            # For transitive dependencies, determine which groups they come
+            # from by examining their dependents
             found_groups = set()
+            for dependent in entry.pkg.dependents:
+                found_groups |= dep_to_groups.get(dependent.package.name, no_groups)
 
-            for dependent in pkg.dependents:
-                # Find which group the dependent belongs to
-                dependent_name = dependent.package.name
-                for group_name, group_deps in dependency_groups_from_toml.items():
-                    if dependent_name in group_deps:
-                        found_groups.add(group_name)
-
-            # If no specific group found, put in main
-            if not found_groups:
-                found_groups.add("")
+        # If not found in any specific group, put in main
+        if not found_groups:
+            found_groups.add("")
 
-            # Add to all groups it comes from
-            for group_name in found_groups:
-                groups.setdefault(group_name, []).append((name, pkg, outdated_pkg, is_direct))
+        # Add to all groups it belongs to
+        for group_name in found_groups:
+            groups.setdefault(group_name, []).append(entry)
 
-    return groups
+    # Return the groups in presentation order (main dependencies first, then
+    # extras alphabetically) so callers can iterate without re-sorting
+    return dict(sorted(groups.items(), key=lambda item: (item[0] != "", item[0])))
@@ -1,7 +1,9 @@
 # mypy: ignore-errors
-import importlib.metadata
+import io
 import unittest
-from pathlib import Path
+from collections import deque
+from contextlib import ExitStack
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
 from packaging.requirements import Requirement
@@ -22,55 +24,83 @@ from uv_outdated.utils import (
     get_site_packages_from_uv,
     get_all_metadata_from_site_packages,
     find_direct_ancestors,
+    compute_ancestor_map,
+    group_outdated_by_ancestor,
+    group_packages_by_dependency_groups,
+    OutEntry,
     Name,
 )
 
 
 class TestOutdatedScript(unittest.TestCase):
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_get_package_specifiers(self, mock_site_packages):
-        """Test that get_package_specifiers extracts specifiers correctly."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
+    _pkgs_empty: dict[Name, Package]
+    _direct: dict[str, Requirement]
 
-        packages = get_locked_packages_and_deps()
+    @classmethod
+    def setUpClass(cls):
+        """
+        Build the empty-site-packages graph and direct dependencies once.
+
+        Most tests only read the graph, so they share this fixture via a
+        shallow copy instead of reparsing uv.lock per test. Tests that need a
+        populated site-packages (or exercise the builder's error handling)
+        still call get_locked_packages_and_deps themselves.
+        """
+        with patch("uv_outdated.utils.get_all_metadata_from_site_packages", return_value={}):
+            cls._pkgs_empty = get_locked_packages_and_deps()
+        # get_direct_dependencies memoizes on pyproject.toml's mtime, so the
+        # fixture and the test that calls it directly share one parse
+        cls._direct = get_direct_dependencies()
+
+        # Representative packages, found in one pass so tests don't rescan
+        # the graph for the first match of a predicate
+        cls._first_with_dependents = None
+        for pkg in cls._pkgs_empty.values():
+            if cls._first_with_dependents is None and pkg.dependents:
+                cls._first_with_dependents = pkg
+                break
+
+    def setUp(self):
+        # Empty site-packages is the common case, so it is stubbed here once;
+        # tests that need populated metadata or error behavior override
+        # self._site_mock.
+        self._stack = ExitStack()
+        self.addCleanup(self._stack.close)
+        self._site_mock = self._stack.enter_context(
+            patch("uv_outdated.utils.get_all_metadata_from_site_packages", return_value={})
+        )
+
+    def test_get_package_specifiers(self):
+        """Test that get_package_specifiers extracts specifiers correctly."""
+        packages = dict(self._pkgs_empty)
         specifiers = get_package_specifiers(packages)
 
         self.assertIsInstance(specifiers, dict)
-        # Check that all values are strings
-        for spec in specifiers.values():
-            self.assertIsInstance(spec, str)
+        # Check that all values are strings, in one C-level reduction
+        self.assertTrue(all(type(spec) is str for spec in specifiers.values()))
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_package_dependents_from_objects(self, mock_site_packages):
+    def test_package_dependents_from_objects(self):
         """Test that Package objects have dependents correctly populated."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-
-        # Find a package with dependents
-        pkg_with_dependents = None
-        for pkg in packages.values():
-            if pkg.dependents:
-                pkg_with_dependents = pkg
-                break
+        pkg_with_dependents = self._first_with_dependents
 
         if pkg_with_dependents is not None:
             # Check that dependents are properly structured
             for dependent in pkg_with_dependents.dependents:
                 self.assertIsInstance(dependent.package.name, str)
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_package_summary_population(self, mock_site_packages):
+    def test_package_summary_population(self):
         """Test that Package summaries are populated from site-packages."""
+        # Deferred: importlib.metadata transitively imports email and csv,
+        # and only this test touches it
+        import importlib.metadata
+
         # Create a proper mock distribution
         mock_dist = MagicMock()
         # Type ignore needed for test mocking
         mock_dist.__class__ = importlib.metadata.PathDistribution  # type: ignore[assignment]
 
         # Mock site-packages to return some sample data
-        mock_site_packages.return_value = {
+        self._site_mock.return_value = {
             "django": SitePackage(
                 name="django",
                 version="5.0.1",
@@ -89,92 +119,9 @@ class TestOutdatedScript(unittest.TestCase):
             # Django should have a summary from our mock
             self.assertIn("framework", django_pkg.summary.lower())
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_package_dependencies_structure(self, mock_site_packages):
-        """Test that Package dependencies are properly structured."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-
-        # Find a package with dependencies
-        pkg_with_deps = None
-        for pkg in packages.values():
-            if pkg.requires:
-                pkg_with_deps = pkg
-                break
-
-        self.assertIsNotNone(pkg_with_deps, "Should find at least one package with dependencies")
-
-        # Check main dependencies (empty string key)
-        if pkg_with_deps is not None and "" in pkg_with_deps.requires:
-            main_group = pkg_with_deps.requires[""]
-            self.assertIsInstance(main_group, DependencyGroup)
-            self.assertEqual(main_group.name, "")
-            self.assertIsInstance(main_group.dependencies, list)
-            for req in main_group.dependencies:
-                self.assertIsInstance(req, Requirement)
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_package_optional_dependencies(self, mock_site_packages):
-        """Test that Package optional dependencies (extras) are handled correctly."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-
-        # Find a package with optional dependencies
-        pkg_with_extras = None
-        for pkg in packages.values():
-            if any(key != "" for key in pkg.requires):
-                pkg_with_extras = pkg
-                break
-
-        if pkg_with_extras is not None:
-            # Check that extra dependencies are properly structured
-            for extra_name, dep_group in pkg_with_extras.requires.items():
-                if extra_name != "":  # Skip main dependencies
-                    self.assertIsInstance(dep_group, DependencyGroup)
-                    self.assertEqual(dep_group.name, extra_name)
-                    self.assertIsInstance(dep_group.dependencies, list)
-                    for req in dep_group.dependencies:
-                        self.assertIsInstance(req, Requirement)
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_package_dependents_structure(self, mock_site_packages):
-        """Test that Package dependents are properly structured."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-
-        # Find a package with dependents
-        pkg_with_dependents = None
-        for pkg in packages.values():
-            if pkg.dependents:
-                pkg_with_dependents = pkg
-                break
-
-        self.assertIsNotNone(
-            pkg_with_dependents, "Should find at least one package with dependents"
-        )
-
-        # Check dependents structure
-        if pkg_with_dependents is not None:
-            for dependent in pkg_with_dependents.dependents:
-                self.assertIsInstance(dependent, Dependent)
-                self.assertIsInstance(dependent.through, str)
-                self.assertIsInstance(dependent.package, Package)
-                # The dependent package should also be in our packages dict
-                self.assertIn(dependent.package.name, packages)
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_project_package_representation(self, mock_site_packages):
+    def test_project_package_representation(self):
         """Test that the project package is represented in the results."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
+        packages = dict(self._pkgs_empty)
 
         # The project package should be present
         self.assertIn("uv-outdated", packages)
@@ -187,15 +134,10 @@ class TestOutdatedScript(unittest.TestCase):
 
     def test_graceful_site_packages_handling(self):
         """Test that the function handles site-packages unavailability gracefully."""
-
-        def mock_get_site_packages():
-            raise RuntimeError("Site-packages not available")
+        self._site_mock.side_effect = RuntimeError("Site-packages not available")
 
         # Should not raise an exception
-        with patch(
-            "uv_outdated.utils.get_all_metadata_from_site_packages", new=mock_get_site_packages
-        ):
-            packages = get_locked_packages_and_deps()
+        packages = get_locked_packages_and_deps()
         self.assertIsInstance(packages, dict)
         self.assertGreater(len(packages), 0)
 
@@ -206,54 +148,72 @@ class TestOutdatedScript(unittest.TestCase):
             # Summary should be empty when site-packages unavailable
             self.assertEqual(pkg.summary, "")
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_uv_lock_structure_handling(self, mock_site_packages):
-        """Test that the function correctly handles uv.lock structure."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
+    def test_graph_invariants(self):
+        """
+        Walk the package graph once and check all structural invariants.
 
-        # Test docstring point 4: project package should have dev-dependencies
-        if "uv-outdated" in packages:
-            project_pkg = packages["uv-outdated"]
-            # Project should have main dependencies
-            self.assertIn("", project_pkg.requires, "Project should have main dependencies")
+        Replaces separate per-aspect tests that each rebuilt and re-traversed
+        the graph: overall Package structure, dependency groups, optional
+        dependencies (extras), dependents, and 'through' tracking.
+        """
+        packages = dict(self._pkgs_empty)
 
-            # Check that we have some dependencies
-            main_deps = project_pkg.requires[""]
-            self.assertGreater(
-                len(main_deps.dependencies), 0, "Project should have main dependencies"
-            )
+        self.assertIsInstance(packages, dict)
+        self.assertIn("packaging", packages)
 
-        # Test docstring point 9: packages should have optional-dependencies (extras)
-        pkg_with_extras = None
-        for pkg in packages.values():
-            if any(key != "" for key in pkg.requires):
-                pkg_with_extras = pkg
-                break
+        # The project package should have main dependencies
+        self.assertIn("uv-outdated", packages)
+        project_pkg = packages["uv-outdated"]
+        self.assertIn("", project_pkg.requires, "Project should have main dependencies")
+        self.assertGreater(
+            len(project_pkg.requires[""].dependencies), 0, "Project should have main dependencies"
+        )
 
-        if pkg_with_extras:
-            # Verify that extras are properly handled
-            for extra_name, dep_group in pkg_with_extras.requires.items():
-                if extra_name != "":
+        seen_requires = False
+        seen_dependents = False
+        for name, pkg in packages.items():
+            with self.subTest(pkg=name):
+                self.assertIsInstance(pkg, Package)
+                self.assertEqual(pkg.name, name)
+                self.assertIsInstance(pkg.version, str)
+                self.assertIsInstance(pkg.summary, str)
+                self.assertIsInstance(pkg.requires, dict)
+                self.assertIsInstance(pkg.dependents, list)
+
+                # Dependency groups: "" holds main dependencies, other keys are extras
+                for group_name, dep_group in pkg.requires.items():
+                    seen_requires = True
                     self.assertIsInstance(dep_group, DependencyGroup)
-                    self.assertEqual(dep_group.name, extra_name)
-
-        # Test docstring point 12: dependents should track through which extra they come
-        for pkg in packages.values():
-            for dependent in pkg.dependents:
-                # The 'through' field should indicate the dependency group
-                self.assertIsInstance(dependent.through, str)
-                # Empty string means main dependencies, non-empty means extra
-                self.assertIn(dependent.through, ["", *list(dependent.package.requires.keys())])
+                    self.assertEqual(dep_group.name, group_name)
+                    self.assertIsInstance(dep_group.dependencies, list)
+                    self.assertTrue(
+                        all(isinstance(req, Requirement) for req in dep_group.dependencies)
+                    )
+
+                # Dependents point back into the graph and track their group
+                for dependent in pkg.dependents:
+                    seen_dependents = True
+                    self.assertIsInstance(dependent, Dependent)
+                    self.assertIsInstance(dependent.through, str)
+                    self.assertIsInstance(dependent.package, Package)
+                    self.assertIn(dependent.package.name, packages)
+                    # Empty string means main dependencies, non-empty means extra
+                    self.assertIn(dependent.through, ["", *dependent.package.requires.keys()])
+
+        self.assertTrue(seen_requires, "Should find at least one package with dependencies")
+        self.assertTrue(seen_dependents, "Should find at least one package with dependents")
 
     def test_canonicalize_name(self):
-        """Test that package name canonicalization works correctly."""
-        self.assertEqual(canonicalize_name("Django"), "django")
-        self.assertEqual(canonicalize_name("django-cors-headers"), "django-cors-headers")
-        self.assertEqual(canonicalize_name("Django_CORS_Headers"), "django-cors-headers")
-        self.assertEqual(canonicalize_name("DJANGO.CORS.HEADERS"), "django-cors-headers")
+        """Test that package name canonicalization is correct and consistent."""
+        cases = [
+            ("Django", "django"),
+            ("django-cors-headers", "django-cors-headers"),
+            ("Django_CORS_Headers", "django-cors-headers"),
+            ("DJANGO.CORS.HEADERS", "django-cors-headers"),
+        ]
+        for name, expected in cases:
+            with self.subTest(name=name):
+                self.assertEqual(canonicalize_name(name), expected)
 
     def test_is_locked_by_specifier(self):
         """Test the is_locked_by_specifier function."""
@@ -281,15 +241,23 @@ class TestOutdatedScript(unittest.TestCase):
         # Test missing package
         self.assertFalse(is_locked_by_specifier(specifiers, "missing", "1.0.0"))
 
+    def test_is_locked_by_specifier_caches_parses(self):
+        """Repeated lock checks reuse the cached SpecifierSet parse."""
+        from uv_outdated import utils
+
+        specifiers = {"django": ">=5.0,<5.1"}
+
+        utils._parse_spec.cache_clear()
+        with patch.object(utils, "SpecifierSet", wraps=utils.SpecifierSet) as spec_ctor:
+            for _ in range(3):
+                self.assertTrue(is_locked_by_specifier(specifiers, "django", "5.2.0"))
+        self.assertEqual(spec_ctor.call_count, 1)
+
     @patch("subprocess.run")
     def test_run_uv(self, mock_run):
         """Test that run_uv function works and returns a CompletedProcess."""
         # Mock subprocess.run to return a successful result
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = "uv 0.4.0"
-        mock_result.stderr = ""
-        mock_run.return_value = mock_result
+        mock_run.return_value = SimpleNamespace(returncode=0, stdout="uv 0.4.0", stderr="")
 
         result = run_uv(["uv", "--version"])
         self.assertEqual(result.returncode, 0)
@@ -297,48 +265,25 @@ class TestOutdatedScript(unittest.TestCase):
 
     @patch("uv_outdated.utils.run_uv")
     def test_get_uv_outdated(self, mock_run_uv):
-        """Test that get_uv_outdated returns a dictionary of outdated packages."""
-        # Mock run_uv to return sample outdated packages JSON
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = '[{"name": "django", "version": "5.0.1", "latest_version": "5.1.0"}]'
-        mock_result.stderr = ""
-        mock_run_uv.return_value = mock_result
-
-        outdated = get_uv_outdated()
-        self.assertIsInstance(outdated, dict)
-
-        # Check that all values are OutdatedPkg instances
-        for pkg in outdated.values():
-            self.assertIsInstance(pkg, OutdatedPkg)
-            self.assertTrue(hasattr(pkg, "name"))
-            self.assertTrue(hasattr(pkg, "version"))
-            self.assertTrue(hasattr(pkg, "latest_version"))
-
-    @patch("uv_outdated.utils.run_uv")
-    def test_get_uv_outdated_fallback(self, mock_run_uv):
-        """Test that get_uv_outdated gracefully handles failures."""
-        # Test case 1: Command fails (no venv)
-        mock_result = MagicMock()
-        mock_result.returncode = 1
-        mock_result.stderr = "No virtual environment found"
-        mock_run_uv.return_value = mock_result
-
-        # Should return empty dict instead of raising exception
-        outdated = get_uv_outdated()
-        self.assertIsInstance(outdated, dict)
-        self.assertEqual(len(outdated), 0)
+        """Test get_uv_outdated on success and on its graceful fallbacks."""
+        sample_json = '[{"name": "django", "version": "5.0.1", "latest_version": "5.1.0"}]'
+        cases = [
+            ("success", 0, sample_json, 1),
+            ("command fails (no venv)", 1, "No virtual environment found", 0),
+            ("JSON parsing fails", 0, "Invalid JSON", 0),
+        ]
+        for case, returncode, stdout, expected_len in cases:
+            with self.subTest(case=case):
+                mock_run_uv.return_value = SimpleNamespace(
+                    returncode=returncode, stdout=stdout, stderr=""
+                )
 
-        # Test case 2: JSON parsing fails
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = "Invalid JSON"
-        mock_run_uv.return_value = mock_result
+                outdated = get_uv_outdated()
+                self.assertIsInstance(outdated, dict)
+                self.assertEqual(len(outdated), expected_len)
 
-        # Should return empty dict instead of raising exception
-        outdated = get_uv_outdated()
-        self.assertIsInstance(outdated, dict)
-        self.assertEqual(len(outdated), 0)
+                # Check that all values are OutdatedPkg instances
+                self.assertTrue(all(type(pkg) is OutdatedPkg for pkg in outdated.values()))
 
     def test_get_direct_dependencies(self):
         """Test that get_direct_dependencies parses pyproject.toml correctly."""
@@ -355,260 +300,196 @@ class TestOutdatedScript(unittest.TestCase):
         for req in direct.values():
             self.assertIsInstance(req, Requirement)
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_get_locked_packages_and_deps(self, mock_site_packages):
-        """Test that get_locked_packages_and_deps returns the expected structure."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-
-        # Check return type is dict[Name, Package] as specified in docstring
-        self.assertIsInstance(packages, dict)
-
-        # Check that some known packages are present
-        self.assertIn("packaging", packages)
-
-        # Check that all values are Package instances
-        for pkg in packages.values():
-            self.assertIsInstance(pkg, Package)
-            self.assertTrue(hasattr(pkg, "name"))
-            self.assertTrue(hasattr(pkg, "version"))
-            self.assertTrue(hasattr(pkg, "summary"))
-            self.assertTrue(hasattr(pkg, "requires"))
-            self.assertTrue(hasattr(pkg, "dependents"))
-
-        # Check that Package objects have proper structure
-        django_pkg = packages["packaging"]
-        self.assertEqual(django_pkg.name, "packaging")
-        self.assertIsInstance(django_pkg.version, str)
-        self.assertIsInstance(django_pkg.summary, str)
-        self.assertIsInstance(django_pkg.requires, dict)
-        self.assertIsInstance(django_pkg.dependents, list)
-
-        # Check that requires contains DependencyGroup instances
-        for dep_group in django_pkg.requires.values():
-            self.assertIsInstance(dep_group, DependencyGroup)
-            self.assertIsInstance(dep_group.name, str)
-            self.assertIsInstance(dep_group.dependencies, list)
-            for req in dep_group.dependencies:
-                self.assertIsInstance(req, Requirement)
-
-        # Check that dependents contain Dependent instances
-        for dependent in django_pkg.dependents:
-            self.assertIsInstance(dependent, Dependent)
-            self.assertIsInstance(dependent.through, str)
-            self.assertIsInstance(dependent.package, Package)
-
     @patch("uv_outdated.utils.run_uv")
     def test_get_site_packages_from_uv(self, mock_run_uv):
         """Test that get_site_packages_from_uv returns a valid path."""
+        from pathlib import Path
+
         # Mock run_uv to return a fake Python path
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = "/fake/venv/bin/python"
-        mock_result.stderr = ""
-        mock_run_uv.return_value = mock_result
-
-        # Mock the pyvenv.cfg file reading and path operations
-        mock_file = MagicMock()
-        mock_file.__enter__ = lambda self: self
-        mock_file.__exit__ = lambda self, *args: None
-        mock_file.__iter__ = lambda self: iter(["version = 3.12.0\n"])
+        mock_run_uv.return_value = SimpleNamespace(
+            returncode=0, stdout="/fake/venv/bin/python", stderr=""
+        )
 
-        with (
-            patch("pathlib.Path.open", return_value=mock_file),
-            patch("pathlib.Path.is_dir", return_value=True),
-        ):
-            site_packages = get_site_packages_from_uv()
-            self.assertIsInstance(site_packages, Path)
-            self.assertEqual(site_packages.name, "site-packages")
+        # Both pyvenv.cfg dialects: stdlib venvs write "version", uv and
+        # virtualenv write "version_info"
+        pyvenv_cfgs = [
+            ("stdlib venv", "home = /usr\nversion = 3.12.0\n"),
+            ("uv venv", "home = /usr\nimplementation = CPython\nversion_info = 3.12.0\n"),
+        ]
+        for case, pyvenv_cfg in pyvenv_cfgs:
+            with self.subTest(case=case):
+                get_site_packages_from_uv.cache_clear()
+                with (
+                    patch("pathlib.Path.read_text", return_value=pyvenv_cfg),
+                    patch("pathlib.Path.is_dir", return_value=True),
+                ):
+                    site_packages = get_site_packages_from_uv()
+                    self.assertIsInstance(site_packages, Path)
+                    self.assertEqual(site_packages.name, "site-packages")
+                    self.assertEqual(site_packages.parent.name, "python3.12")
 
     @patch("uv_outdated.utils.get_site_packages_from_uv")
-    @patch("pathlib.Path.glob")
-    def test_get_all_metadata_from_site_packages(self, mock_glob, mock_site_packages_path):
+    @patch("uv_outdated.utils.os.scandir")
+    def test_get_all_metadata_from_site_packages(self, mock_scandir, mock_site_packages_path):
         """Test that get_all_metadata_from_site_packages returns package metadata."""
+        from pathlib import Path
+
         # Mock site-packages path
         mock_site_packages_path.return_value = Path("/fake/site-packages")
 
-        # Mock dist-info directories
-        mock_dist_info = MagicMock()
-        mock_dist_info.name = "django-5.0.1.dist-info"
-        mock_glob.return_value = [mock_dist_info]
-
-        # Mock PathDistribution and metadata
-        with patch("importlib.metadata.PathDistribution") as mock_path_dist:
-            mock_dist = MagicMock()
-            mock_metadata = MagicMock()
-            mock_metadata.__getitem__ = lambda self, key: {
-                "Name": "Django",
-                "Version": "5.0.1",
-                "Summary": "A high-level Python web framework",
-            }[key]
-            mock_metadata.get = lambda key, default="": {
-                "Name": "Django",
-                "Version": "5.0.1",
-                "Summary": "A high-level Python web framework",
-            }.get(key, default)
-            mock_metadata.get_all = lambda key: []
-            mock_dist.metadata = mock_metadata
-            mock_path_dist.return_value = mock_dist
+        # Mock dist-info directory entries
+        mock_entry = SimpleNamespace(
+            name="django-5.0.1.dist-info",
+            path="/fake/site-packages/django-5.0.1.dist-info",
+            is_dir=lambda: True,
+        )
+        mock_scandir.return_value.__enter__.return_value = [mock_entry]
+
+        # Mock the METADATA file contents
+        metadata_bytes = (
+            b"Metadata-Version: 2.1\n"
+            b"Name: Django\n"
+            b"Version: 5.0.1\n"
+            b"Summary: A high-level Python web framework\n"
+            b"Requires-Dist: sqlparse>=0.3.1\n"
+            b"\n"
+            b"The long description should not be parsed.\n"
+        )
 
+        get_all_metadata_from_site_packages.cache_clear()
+        with patch("pathlib.Path.open", return_value=io.BytesIO(metadata_bytes)):
             metadata = get_all_metadata_from_site_packages()
-            self.assertIsInstance(metadata, dict)
-
-            # Check that all values are SitePackage instances
-            for pkg in metadata.values():
-                self.assertIsInstance(pkg, SitePackage)
-                self.assertTrue(hasattr(pkg, "name"))
-                self.assertTrue(hasattr(pkg, "version"))
-                self.assertTrue(hasattr(pkg, "summary"))
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_find_direct_ancestors(self, mock_site_packages):
-        """Test that find_direct_ancestors correctly identifies dependency ancestors."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
+        self.assertIsInstance(metadata, dict)
+        self.assertIn("django", metadata)
+        self.assertEqual(metadata["django"].version, "5.0.1")
+        self.assertEqual(metadata["django"].requires_dist, ["sqlparse>=0.3.1"])
+
+        # Check that all values are SitePackage instances
+        for pkg in metadata.values():
+            self.assertIsInstance(pkg, SitePackage)
+            self.assertTrue(hasattr(pkg, "name"))
+            self.assertTrue(hasattr(pkg, "version"))
+            self.assertTrue(hasattr(pkg, "summary"))
 
-        packages = get_locked_packages_and_deps()
-        direct = get_direct_dependencies()
+    def test_find_direct_ancestors(self):
+        """Test find_direct_ancestors on a known dependency and on edge cases."""
+        packages = dict(self._pkgs_empty)
+        direct = self._direct
 
-        # Test with a known transitive dependency
-        if "sqlparse" in packages and "django" in direct:
+        with self.subTest(case="known transitive dependency"):
             # sqlparse is typically a dependency of django
-            ancestors = find_direct_ancestors("sqlparse", packages)
-            # Should find django as an ancestor (or another direct dependency)
-            self.assertGreater(len(ancestors), 0)
-            # All ancestors should be direct dependencies
-            for ancestor in ancestors:
-                self.assertIn(ancestor, direct)
-
-        # Test with a package that doesn't exist
-        ancestors = find_direct_ancestors("nonexistent-package", packages)
-        self.assertEqual(len(ancestors), 0)
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    @patch("uv_outdated.utils.get_uv_outdated")
-    def test_group_by_ancestor_functionality(self, mock_outdated, mock_site_packages):
-        """Test that group-by-ancestor functionality works correctly."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        # Mock outdated packages
-        mock_outdated.return_value = {
-            "django": OutdatedPkg(name="django", version="5.0.1", latest_version="5.1.0"),
-            "sqlparse": OutdatedPkg(name="sqlparse", version="0.4.4", latest_version="0.5.0"),
-        }
-
+            if "sqlparse" in packages and "django" in direct:
+                ancestors = find_direct_ancestors("sqlparse", packages, direct)
+                # Should find django as an ancestor (or another direct dependency)
+                self.assertGreater(len(ancestors), 0)
+                # All ancestors should be direct dependencies
+                for ancestor in ancestors:
+                    self.assertIn(ancestor, direct)
+
+        with self.subTest(case="nonexistent package"):
+            ancestors = find_direct_ancestors("nonexistent-package", packages)
+            self.assertEqual(len(ancestors), 0)
+
+        with self.subTest(case="empty packages dict"):
+            empty_packages: dict[Name, Package] = {}
+            ancestors = find_direct_ancestors("nonexistent", empty_packages)
+            self.assertEqual(len(ancestors), 0)
+
+    def test_group_by_ancestor_functionality(self):
+        """Test the grouping partition that backs the CLI's grouped output."""
         # Get test data
-        packages = get_locked_packages_and_deps()
-        direct = get_direct_dependencies()
-        outdated = mock_outdated.return_value
-
-        # Simulate the grouping logic
-        groups: dict[str, list[tuple[Name, Package, OutdatedPkg, bool]]] = {}
-        direct_dependencies_with_groups: set[str] = set()
-
-        # Process some test packages
-        test_packages = []
-        for name, pkg in packages.items():
-            if name in outdated:
-                outdated_pkg = outdated[name]
-                is_direct = name in direct
-                test_packages.append((name, pkg, outdated_pkg, is_direct))
+        packages = dict(self._pkgs_empty)
+        direct = self._direct
+        ancestor_map = compute_ancestor_map(packages, direct)
+
+        # Mark one direct and one transitive package from the fixture as
+        # outdated, so both partitions are exercised against real graph data
+        direct_name = next(name for name in direct if name in packages)
+        transitive_name = next(name for name in packages if name not in direct)
+        outdated = {
+            name: OutdatedPkg(name=name, version="0.0.1", latest_version="99.0.0")
+            for name in (direct_name, transitive_name)
+        }
 
-                if is_direct:
-                    groups.setdefault(name, []).append((name, pkg, outdated_pkg, is_direct))
+        entries = [
+            OutEntry(name, packages[name], outdated_pkg, name in direct)
+            for name, outdated_pkg in outdated.items()
+        ]
+        self.assertTrue(entries)
+        # Route the entries through the dependency-group bucketing first, the
+        # same way cli() does, so this test exercises the full row pipeline
+        dependency_groups = group_packages_by_dependency_groups(entries)
+        grouped_entries = [
+            entry for group_entries in dependency_groups.values() for entry in group_entries
+        ]
+        direct_groups, transitive_groups = group_outdated_by_ancestor(grouped_entries, ancestor_map)
+
+        # Direct outdated packages form their own groups
+        self.assertIsInstance(direct_groups, dict)
+        for group_key, entry in direct_groups.items():
+            self.assertIn(group_key, direct)
+            self.assertEqual(entry.name, group_key)
+            self.assertTrue(entry.is_direct)
+
+        # Transitives are listed under each of their direct ancestors, or
+        # under the "_unknown" bucket when no ancestor is known
+        self.assertIsInstance(transitive_groups, dict)
+        for group_key, group_entries in transitive_groups.items():
+            self.assertIsInstance(group_entries, list)
+            for entry in group_entries:
+                self.assertIsInstance(entry, OutEntry)
+                self.assertFalse(entry.is_direct)
+                if group_key != "_unknown":
+                    self.assertIn(group_key, ancestor_map[entry.name])
                 else:
-                    ancestors = find_direct_ancestors(name, packages)
-                    if ancestors:
-                        for ancestor in sorted(ancestors):
-                            groups.setdefault(ancestor, []).append(
-                                (name, pkg, outdated_pkg, is_direct)
-                            )
-                            direct_dependencies_with_groups.add(ancestor)
-
-        # Verify grouping logic
-        self.assertIsInstance(groups, dict)
-        self.assertIsInstance(direct_dependencies_with_groups, set)
-
-        # All group keys should be string names
-        for group_key in groups:
-            self.assertIsInstance(group_key, str)
-
-        # All group values should be lists of tuples
-        for group_packages in groups.values():
-            self.assertIsInstance(group_packages, list)
-            for item in group_packages:
-                self.assertIsInstance(item, tuple)
-                self.assertEqual(len(item), 4)  # (name, pkg, outdated_pkg, is_direct)
-
-        # Check that packages in direct_dependencies_with_groups are in groups
-        for direct_with_transitive in direct_dependencies_with_groups:
-            self.assertIn(direct_with_transitive, groups)
-
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_find_direct_ancestors_edge_cases(self, mock_site_packages):
-        """Test find_direct_ancestors with edge cases."""
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
-        direct = get_direct_dependencies()
-
-        # Test with empty packages dict
-        empty_packages: dict[Name, Package] = {}
-        ancestors = find_direct_ancestors("nonexistent", empty_packages)
-        self.assertEqual(len(ancestors), 0)
+                    self.assertNotIn(entry.name, ancestor_map)
 
-        # Test with a known transitive dependency
-        if "sqlparse" in packages and "django" in direct:
-            ancestors = find_direct_ancestors("sqlparse", packages)
-            # Should find at least one ancestor (django or another that depends on
-            # sqlparse)
-            for ancestor in ancestors:
-                self.assertIn(ancestor, direct)
+        # A direct outdated package should form its own group
+        self.assertIn(direct_name, direct_groups)
 
-    def test_package_formatting_consistency(self):
-        """Test that package name formatting is consistent across display modes."""
-        from packaging.utils import canonicalize_name
+    def test_compute_ancestor_map(self):
+        """Test that compute_ancestor_map agrees with find_direct_ancestors."""
+        packages = dict(self._pkgs_empty)
+        direct = self._direct
 
-        # Test canonicalization consistency
-        test_names = ["Django", "django-cors-headers", "Django_CORS_Headers", "DJANGO.CORS.HEADERS"]
+        ancestor_map = compute_ancestor_map(packages, direct)
 
-        expected = ["django", "django-cors-headers", "django-cors-headers", "django-cors-headers"]
-
-        for name, expected_canonical in zip(test_names, expected, strict=False):
-            self.assertEqual(canonicalize_name(name), expected_canonical)
+        # The single-pass map should agree with the per-package search
+        for name in packages:
+            if name in direct:
+                continue
+            expected = find_direct_ancestors(name, packages, direct)
+            self.assertEqual(set(ancestor_map.get(name, frozenset())), expected)
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    @patch("uv_outdated.utils.get_uv_outdated")
-    def test_direct_dependency_appears_as_group_header(self, mock_outdated, mock_site_packages):
+    def test_direct_dependency_appears_as_group_header(self):
         """
         Test that direct dependencies appear as group headers even if not
         outdated.
         """
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        # Mock outdated packages - include a transitive dependency
-        mock_outdated.return_value = {
+        # Outdated packages - include a transitive dependency
+        outdated = {
             "sqlparse": OutdatedPkg(name="sqlparse", version="0.4.4", latest_version="0.5.0")
         }
 
-        packages = get_locked_packages_and_deps()
-        direct = get_direct_dependencies()
-        outdated = mock_outdated.return_value
+        packages = dict(self._pkgs_empty)
+        direct = self._direct
 
-        # Find a direct dependency that has outdated transitive dependencies
-        # but might not be outdated itself
+        # Find direct dependencies that have outdated transitive dependencies
+        # but might not be outdated themselves: one reverse BFS from all
+        # outdated transitives upward through dependents, instead of an
+        # ancestor walk per package
         direct_deps_with_transitive_outdated = set()
-
-        for name in packages:
-            if name in outdated and name not in direct:
-                # This is a transitive outdated dependency
-                ancestors = find_direct_ancestors(name, packages)
-                direct_deps_with_transitive_outdated.update(ancestors)
+        queue = deque(name for name in outdated if name not in direct and name in packages)
+        visited = set(queue)
+        while queue:
+            current = queue.popleft()
+            for dependent in packages[current].dependents:
+                dependent_name = dependent.package.name
+                if dependent_name in direct:
+                    direct_deps_with_transitive_outdated.add(dependent_name)
+                elif dependent_name not in visited:
+                    visited.add(dependent_name)
+                    queue.append(dependent_name)
 
         # Test that these direct dependencies would appear in group-by-ancestor output
         # even if they themselves are not outdated
@@ -617,16 +498,12 @@ class TestOutdatedScript(unittest.TestCase):
                 # This direct dependency should appear as a group header
                 self.assertIn(direct_dep, direct)
 
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_specifiers_exclude_non_installed_extras(self, mock_site_packages):
+    def test_specifiers_exclude_non_installed_extras(self):
         """
         Test that get_package_specifiers only includes constraints from
         actually installed extras, not from non-installed extras.
         """
-        # Mock site-packages to return empty dict (simulating no venv)
-        mock_site_packages.return_value = {}
-
-        packages = get_locked_packages_and_deps()
+        packages = dict(self._pkgs_empty)
         specifiers = get_package_specifiers(packages)
 
         # Test that django-ninja's "test" extra constraint on ruff is not included
@@ -649,12 +526,10 @@ class TestOutdatedScript(unittest.TestCase):
             # also correct since the django-ninja test extra is not installed
 
     # Mocked tests that don't require a venv
-    @patch("uv_outdated.utils.get_site_packages_from_uv")
-    @patch("uv_outdated.utils.get_all_metadata_from_site_packages")
-    def test_get_locked_packages_and_deps_mocked(self, mock_site_packages, mock_site_packages_path):
+    def test_get_locked_packages_and_deps_mocked(self):
         """Test get_locked_packages_and_deps with mocked site-packages."""
         # Mock site-packages to be unavailable (RuntimeError)
-        mock_site_packages.side_effect = RuntimeError("Site-packages not available")
+        self._site_mock.side_effect = RuntimeError("Site-packages not available")
 
         # Should still work without site-packages
         packages = get_locked_packages_and_deps()
@@ -667,6 +542,77 @@ class TestOutdatedScript(unittest.TestCase):
             self.assertIsInstance(pkg.version, str)
             self.assertEqual(pkg.summary, "")  # Should be empty without site-packages
 
+    def test_load_state_cache_roundtrip(self):
+        """load_state writes its cache on a miss and reuses it on a hit."""
+        import os
+        import tempfile
+
+        from uv_outdated import utils
+
+        sample_outdated = {
+            "django": OutdatedPkg(name="django", version="5.0.1", latest_version="5.1.0")
+        }
+
+        with (
+            tempfile.TemporaryDirectory() as cache_home,
+            patch.dict(os.environ, {"XDG_CACHE_HOME": cache_home}),
+            patch.object(utils, "get_uv_outdated", return_value=sample_outdated),
+            patch.object(
+                utils, "get_locked_packages_and_deps", wraps=utils.get_locked_packages_and_deps
+            ) as mock_build,
+        ):
+            cache_path = utils._state_cache_path()
+            self.assertIsNotNone(cache_path)
+            self.assertFalse(cache_path.is_file())
+
+            first = utils.load_state()
+            self.assertTrue(cache_path.is_file())
+            self.assertEqual(mock_build.call_count, 1)
+
+            # The hit skips the rebuild but still refreshes the outdated list
+            second = utils.load_state()
+            self.assertEqual(mock_build.call_count, 1)
+
+            self.assertEqual(first[0], second[0])
+            self.assertEqual(set(first[1]), set(second[1]))
+            self.assertEqual(set(first[2]), set(second[2]))
+            self.assertEqual(first[3], second[3])
+
+    def test_load_state_corrupt_cache(self):
+        """A corrupt cache file falls back to a full rebuild."""
+        import gzip
+        import os
+        import pickle
+        import tempfile
+
+        from uv_outdated import utils
+
+        sample_outdated = {
+            "django": OutdatedPkg(name="django", version="5.0.1", latest_version="5.1.0")
+        }
+
+        with (
+            tempfile.TemporaryDirectory() as cache_home,
+            patch.dict(os.environ, {"XDG_CACHE_HOME": cache_home}),
+            patch.object(utils, "get_uv_outdated", return_value=sample_outdated),
+            patch.object(
+                utils, "get_locked_packages_and_deps", wraps=utils.get_locked_packages_and_deps
+            ) as mock_build,
+        ):
+            cache_path = utils._state_cache_path()
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(b"not a gzip pickle")
+
+            state = utils.load_state()
+            self.assertEqual(mock_build.call_count, 1)
+            self.assertEqual(state[0], sample_outdated)
+
+            # The rebuild replaced the corrupt file with a loadable copy
+            with gzip.open(cache_path, "rb") as f:
+                outdated, packages, direct, specifiers = pickle.load(f)
+            self.assertEqual(outdated, sample_outdated)
+            self.assertEqual(set(packages), set(state[1]))
+
     @patch("uv_outdated.utils.get_uv_outdated")
     def test_get_uv_outdated_mocked(self, mock_outdated):
         """Test get_uv_outdated with mocked uv output."""